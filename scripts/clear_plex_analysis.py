@@ -9,43 +9,82 @@ Created: 2025-08-24
 """
 
 import os
+import shlex
+import atexit
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Load config
 CONFIG_PATH = '/data/config.conf'
-config = {}
+
+def parse_config_line(line):
+    """Return [(key, value), ...] for one config.conf line, unquoted roughly as bash would."""
+    try:
+        lex = shlex.shlex(line, posix=True)
+        lex.whitespace_split = True
+        lex.commenters = ''  # shlex would also cut at a '#' inside a word; bash doesn't
+        words = []
+        for word in lex:
+            if word.startswith('#'):
+                break
+            words.append(word)
+    except ValueError:
+        # unbalanced quote: fall back to a plain KEY=VALUE split
+        line = line.strip()
+        if line.startswith('#') or '=' not in line:
+            return []
+        key, value = line.split('=', 1)
+        return [(key.strip(), value.strip())]
+    return [tuple(w.split('=', 1)) for w in words if '=' in w]
 
 with open(CONFIG_PATH, 'r') as f:
-    for line in f:
-        if '=' in line and not line.strip().startswith('#'):
-            key, value = line.strip().split('=', 1)
-            config[key.strip()] = value.strip()
+    config = {key: value for line in f for key, value in parse_config_line(line)}
 
 # Required variables
 PLEX_URL = config.get("PLEX_URL", "")
 PLEX_TOKEN = config.get("PLEX_TOKEN", "")
 
+# HTTP session (keep-alive pool shared by all Plex requests)
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16, pool_maxsize=32,
+    max_retries=Retry(total=3, read=0, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+SESSION.headers["Accept"] = "application/json"
+
 # Logging setup
 LOG_DIR = "/data/logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "clear_plex_analysis.log")
 
+# Single long-lived, line-buffered handle; closed at exit
+_log_fh = open(LOG_FILE, "a", buffering=1)
+atexit.register(_log_fh.close)
+
 def log(msg):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_FILE, "a") as f:
-        f.write(f"[{timestamp}] {msg}\n")
+    _log_fh.write(f"[{timestamp}] {msg}\n")
     print(f"[{timestamp}] {msg}")
 
+def clear_section(section):
+    clear_url = f"{PLEX_URL}/library/sections/{section['key']}/unmatch"
+    response = SESSION.get(clear_url, params={"X-Plex-Token": PLEX_TOKEN}, timeout=5)
+    response.raise_for_status()
+
 def clear_plex_analysis():
     if not PLEX_URL or not PLEX_TOKEN:
         log("PLEX_URL or PLEX_TOKEN not set. Aborting.")
         return
 
     try:
-        url = f"{PLEX_URL}/library/sections?X-Plex-Token={PLEX_TOKEN}"
+        url = f"{PLEX_URL}/library/sections"
         log(f"Connecting to Plex at {PLEX_URL}")
-        response = requests.get(url, timeout=10)
+        response = SESSION.get(url, params={"X-Plex-Token": PLEX_TOKEN}, timeout=10)
         response.raise_for_status()
         sections = response.json()["MediaContainer"]["Directory"]
 
@@ -54,13 +93,19 @@ def clear_plex_analysis():
             log("No music libraries found.")
             return
 
+        music_sections = [s for s in music_sections if s.get("key")]
         for section in music_sections:
-            section_id = section.get("key")
-            section_title = section.get("title", "Unknown")
-            if section_id:
-                log(f"Clearing track analysis data for '{section_title}' (section {section_id})")
-                clear_url = f"{PLEX_URL}/library/sections/{section_id}/unmatch?X-Plex-Token={PLEX_TOKEN}"
-                requests.get(clear_url, timeout=5)
+            log(f"Clearing track analysis data for '{section.get('title', 'Unknown')}' (section {section['key']})")
+
+        # Fire all unmatch requests at once so one stalled section doesn't hold up the rest
+        with ThreadPoolExecutor(max_workers=max(1, len(music_sections))) as ex:
+            futures = {ex.submit(clear_section, s): s for s in music_sections}
+            for fut in as_completed(futures):
+                section = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    log(f"Error clearing '{section.get('title', 'Unknown')}' (section {section['key']}): {e}")
 
         log("Clear analysis process complete.")
 
@@ -6,7 +6,7 @@
 # ------------------------------------------------------------------------------
 # Env (config.conf):
 #   FORCE_PLEX_ANALYZE   : true|false  (if false, script logs+exits 0)
-#   PLEX_ANALYZE_LOUDNESS: true|false  (if true, run section.analyze() after scan)
+#   PLEX_ANALYZE_LOUDNESS: true|false  (if true, request a section analyze after scan)
 #   PLEX_URL             : http://<host>:32400  (required when FORCE_PLEX_ANALYZE=true)
 #   PLEX_TOKEN           : X-Plex-Token string  (required when FORCE_PLEX_ANALYZE=true)
 #   PLEX_LIBRARY         : Library title (default: "Music")
@@ -14,21 +14,34 @@
 #
 # Logs:
 #   /data/logs/plex_analyze.log   (each line starts with [YYYY-MM-DD HH:MM:SS])
-#   /data/plex_analyze.lock       (advisory lock to prevent concurrent runs)
+#   /data/plex_analyze.lock       (POSIX lockf to prevent concurrent runs; "<pid> <epoch>",
+#                                  taken over if older than 2h, guarded by .takeover)
 # ==============================================================================
 
 import os
 import sys
 import time
 import atexit
+import errno
 import fcntl
+import socket
 import requests
 from datetime import datetime
-from plexapi.server import PlexServer
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ------------- utils / logging -------------
+_last_ts_sec = 0
+_last_ts_str = ""
+
 def ts() -> str:
-    return f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]"
+    global _last_ts_sec, _last_ts_str
+    sec = int(time.time())
+    if sec != _last_ts_sec:
+        _last_ts_str = f"[{datetime.fromtimestamp(sec).strftime('%Y-%m-%d %H:%M:%S')}]"
+        _last_ts_sec = sec
+    return _last_ts_str
 
 def getenv_clean(name: str, default: str | None = None) -> str | None:
     v = os.getenv(name, default)
@@ -43,12 +56,24 @@ LOG_DIR = getenv_clean("LOG_DIR") or "/data/logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_PATH = os.path.join(LOG_DIR, "plex_analyze.log")
 
+def _open_log():
+    """Open the log file once (line-buffered); closed at interpreter exit."""
+    try:
+        fh = open(LOG_PATH, "a", encoding="utf-8", buffering=1)
+    except Exception:
+        return None
+    atexit.register(fh.close)
+    return fh
+
+_LOG_FH = _open_log()
+
 def log(msg: str) -> None:
     line = f"{ts()} [PLEX] {msg}"
     print(line, flush=True)
+    if _LOG_FH is None:
+        return
     try:
-        with open(LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
+        _LOG_FH.write(line + "\n")
     except Exception:
         pass
 
@@ -60,20 +85,92 @@ PLEX_URL      = getenv_clean("PLEX_URL")
 PLEX_TOKEN    = getenv_clean("PLEX_TOKEN")
 PLEX_LIBRARY  = getenv_clean("PLEX_LIBRARY") or "Music"
 
+# ------------- http -------------
+# One pooled keep-alive session for every Plex request.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16, pool_maxsize=32,
+    max_retries=Retry(total=3, read=0, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
 LOCK_PATH = "/data/plex_analyze.lock"
+LOCK_STALE_SECS = 2 * 60 * 60  # a holder older than this is assumed hung
 _lock_fh = None
 
+def _try_lockf(fh) -> bool:
+    """Non-blocking POSIX record lock (works across NFS/containers, unlike flock)."""
+    try:
+        fcntl.lockf(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError as e:
+        if e.errno in (errno.EACCES, errno.EAGAIN):
+            return False
+        raise
+
+def _lock_age(path: str) -> float | None:
+    """Seconds since the current holder started (lock file: "<pid> <epoch>"), or None if unknown."""
+    try:
+        with open(path, "r") as f:
+            fields = f.read().split()
+        return time.time() - float(fields[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+def _open_and_lock():
+    """
+    Open and lockf LOCK_PATH. Returns the handle, or None if busy. The lock only
+    counts if the inode we locked is still the one at LOCK_PATH (another instance
+    may have unlinked/replaced it between our open and lock).
+    """
+    fh = open(LOCK_PATH, "a+")
+    try:
+        if _try_lockf(fh):
+            mine, cur = os.fstat(fh.fileno()), os.stat(LOCK_PATH)
+            if (mine.st_dev, mine.st_ino) == (cur.st_dev, cur.st_ino):
+                return fh
+    except FileNotFoundError:
+        pass
+    fh.close()
+    return None
+
+def _stamp(fh) -> None:
+    fh.seek(0); fh.truncate()
+    fh.write(f"{os.getpid()} {int(time.time())}\n"); fh.flush()
+
+def _is_stale() -> bool:
+    age = _lock_age(LOCK_PATH)
+    return age is not None and age >= LOCK_STALE_SECS
+
 def acquire_lock() -> bool:
     global _lock_fh
     try:
-        _lock_fh = open(LOCK_PATH, "a+")
-        fcntl.flock(_lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
-        _lock_fh.seek(0); _lock_fh.truncate()
-        _lock_fh.write(f"{os.getpid()}\n"); _lock_fh.flush()
+        _lock_fh = _open_and_lock()
+        if _lock_fh is None:
+            if not _is_stale():
+                log("Another instance is already running; exiting.")
+                return False
+            # Circuit breaker, serialized by a short-lived guard lock so two instances
+            # can't both take over: re-check under the guard, unlink the stale file
+            # (the hung holder keeps a lock on the orphaned inode), lock a fresh one.
+            with open(f"{LOCK_PATH}.takeover", "a") as guard:
+                fcntl.lockf(guard, fcntl.LOCK_EX)
+                _lock_fh = _open_and_lock()
+                if _lock_fh is None:
+                    if not _is_stale():
+                        log("Another instance is already running; exiting.")
+                        return False
+                    log(f"WARN: {LOCK_PATH} held for over {LOCK_STALE_SECS}s; taking over stale lock.")
+                    os.unlink(LOCK_PATH)
+                    _lock_fh = _open_and_lock()
+                    if _lock_fh is None:
+                        log("Another instance is already running; exiting.")
+                        return False
+                _stamp(_lock_fh)  # before releasing the guard, so the next checker sees a fresh age
+        else:
+            _stamp(_lock_fh)
         return True
-    except BlockingIOError:
-        log("Another instance is already running; exiting.")
-        return False
     except Exception as e:
         log(f"ERROR: Could not open/lock {LOCK_PATH}: {e}")
         return False
@@ -81,26 +178,42 @@ def acquire_lock() -> bool:
 def release_lock():
     try:
         if _lock_fh:
-            fcntl.flock(_lock_fh, fcntl.LOCK_UN)
+            fcntl.lockf(_lock_fh, fcntl.LOCK_UN)
             _lock_fh.close()
     except Exception:
         pass
 
-atexit.register(release_lock)
-
-def wait_for_plex(base: str, token: str, tries: int = 30, delay: float = 2.0) -> bool:
-    """Light readiness probe against /library/sections with token."""
+def wait_for_plex(base: str, token: str, tries: int = 30, max_delay: float = 5.0) -> bool:
+    """
+    Light readiness probe against /library/sections with token.
+    A raw TCP connect goes first so a not-yet-listening server costs no HTTP round-trip;
+    retries back off exponentially from 0.1s up to max_delay.
+    """
     url = f"{base.rstrip('/')}/library/sections"
+    parts = urlsplit(base)
+    addr = (parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+    delay = 0.1
     for _ in range(tries):
         try:
-            r = requests.get(url, params={"X-Plex-Token": token}, timeout=5)
+            with socket.create_connection(addr, timeout=1):
+                pass
+            r = SESSION.get(url, params={"X-Plex-Token": token}, timeout=2)
             if r.status_code == 200:
                 return True
-        except requests.RequestException:
+        except (OSError, requests.RequestException):
             pass
         time.sleep(delay)
+        delay = min(delay * 2, max_delay)
     return False
 
+def plex_request(method: str, path: str, timeout: float = 30) -> requests.Response:
+    """Token-authenticated JSON request against PLEX_URL; raises on HTTP errors."""
+    r = SESSION.request(method, f"{PLEX_URL.rstrip('/')}{path}",
+                        params={"X-Plex-Token": PLEX_TOKEN},
+                        headers={"Accept": "application/json"}, timeout=timeout)
+    r.raise_for_status()
+    return r
+
 def main() -> int:
     # Disabled? Exit cleanly so cron logs stay quiet.
     if not FORCE_PLEX_ANALYZE:
@@ -121,32 +234,28 @@ def main() -> int:
         log("ERROR: Plex did not come online in time.")
         return 3
 
-    # Connect
+    # Locate section (one GET; PlexAPI's server bootstrap is not needed for this)
     try:
-        plex = PlexServer(PLEX_URL.rstrip("/"), PLEX_TOKEN)
+        sections = plex_request("GET", "/library/sections").json()["MediaContainer"].get("Directory", [])
     except Exception as e:
-        log(f"ERROR: Failed to create PlexServer: {e}")
-        return 4
+        log(f"ERROR: Could not list sections: {e}")
+        return 6
 
-    # Locate section
-    try:
-        section = next(s for s in plex.library.sections() if getattr(s, "title", "") == PLEX_LIBRARY)
-    except StopIteration:
+    section = next((s for s in sections if s.get("title", "") == PLEX_LIBRARY), None)
+    if section is None:
         # fallback: first music-type section
-        try:
-            section = next(s for s in plex.library.sections() if getattr(s, "TYPE", "") == "artist")
-            log(f'WARN: Library "{PLEX_LIBRARY}" not found; using music section "{section.title}".')
-        except StopIteration:
+        section = next((s for s in sections if s.get("type", "") == "artist"), None)
+        if section is None:
             log(f'ERROR: Library "{PLEX_LIBRARY}" not found and no music sections detected.')
             return 5
-    except Exception as e:
-        log(f"ERROR: Could not list sections: {e}")
-        return 6
+        log(f'WARN: Library "{PLEX_LIBRARY}" not found; using music section "{section.get("title")}".')
+    key   = section.get("key")
+    title = section.get("title", key)
 
     # --- SCAN (always when FORCE_PLEX_ANALYZE=true) ---
     try:
-        log(f'Starting library scan (update) on "{section.title}"...')
-        section.update()  # "Scan Library Files"
+        log(f'Starting library scan (update) on "{title}"...')
+        plex_request("GET", f"/library/sections/{key}/refresh")  # "Scan Library Files"
         log("Library scan submitted to Plex Server.")
     except Exception as e:
         log(f"ERROR: Library scan request failed: {e}")
@@ -155,8 +264,8 @@ def main() -> int:
     # --- ANALYZE (only if PLEX_ANALYZE_LOUDNESS=true) ---
     if PLEX_ANALYZE_LOUDNESS:
         try:
-            log(f'Starting library analyze on "{section.title}" (server settings decide loudness/sonic)...')
-            section.analyze()  # schedules analyze jobs; respects server toggles
+            log(f'Starting library analyze on "{title}" (server settings decide loudness/sonic)...')
+            plex_request("PUT", f"/library/sections/{key}/analyze")  # schedules analyze jobs; respects server toggles
             log("Library analyze request submitted to Plex Server.")
         except Exception as e:
             log(f"ERROR: Library analyze request failed: {e}")
@@ -168,4 +277,8 @@ def main() -> int:
     return 0
 
 if __name__ == "__main__":
-    sys.exit(main())
+    try:
+        rc = main()
+    finally:
+        release_lock()
+    sys.exit(rc)
@@ -7,7 +7,7 @@
 # Behavior:
 #   • Ensures /data/logs exists (prevents 'No such file or directory' on redirect)
 #   • Sources /data/config.conf (if present) and exports key env vars
-#   • Verifies required tools (python3, ffmpeg, mp3gain)
+#   • Verifies required tools (python3, ffmpeg)
 #   • Starts a timestamped run and launches the Python re-encode worker
 #   • DOES NOT redirect Python stdout into the same log to avoid duplicate lines
 # Logging:
@@ -38,13 +38,12 @@ fi
 export MUSIC_DIR="${MUSIC_DIR:-/music}"
 export GAIN_THRESHOLD="${GAIN_THRESHOLD:-5}"
 export LOG_DIR="${LOG_DIR}"
-# Optional knobs (used by Python if set): FFMPEG_VBR_QUALITY, ID3_VERSION, MAX_FILES, DRY_RUN
+# Optional knobs (used by Python if set): FFMPEG_VBR_QUALITY, ID3_VERSION, MAX_FILES, DRY_RUN, REENCODE_WORKERS
 
 # --- Preflight checks ---------------------------------------------------------
 need=0
 command -v python3 >/dev/null 2>&1 || { log "[ERROR] python3 not found"; need=1; }
 command -v ffmpeg  >/dev/null 2>&1 || { log "[ERROR] ffmpeg not found";  need=1; }
-command -v mp3gain >/dev/null 2>&1 || { log "[ERROR] mp3gain not found"; need=1; }
 if [[ $need -ne 0 ]]; then
   log "[ERROR] Missing required tools; aborting."
   exit 127
@@ -7,12 +7,16 @@
 # Behavior:
 #   • Reads candidates from /data/processed.list (format: "<timestamp>\t<path>\t<gain>")
 #   • Selects tracks where abs(gain) >= GAIN_THRESHOLD
-#   • Re-encodes each candidate in-place using ffmpeg (basic tags preserved)
-#   • Removes mp3gain/APE tags on the output (mp3gain -s d)
-#   • Atomically replaces the source file with the new file
-#   • Removes the file’s line from /data/processed.list (so mp3gain runs again later)
+#   • Re-encodes candidates in-place using ffmpeg (basic tags preserved),
+#     REENCODE_WORKERS files at a time
+#   • Removes mp3gain/APE tags on the output (in-process footer truncate, no mp3gain call)
+#   • fdatasyncs the new file once, then atomically replaces the source with it
+#   • Removes re-encoded files’ lines from /data/processed.list (so mp3gain runs again
+#     later), rewriting it every PROC_FLUSH_EVERY (25) successes or PROC_FLUSH_SECS (30s),
+#     whichever comes first, and once more on exit (including SIGTERM)
 #   • Logs to /data/logs/reencode_gain.log with [HH:MM:SS] prefix
-#   • On exit, triggers /scripts/plex_analyze.sh (best-effort; exit code preserved)
+#   • After a run that re-encoded at least one file, triggers /scripts/plex_analyze.sh
+#     (best-effort; exit code preserved)
 #
 # Env:
 #   MUSIC_DIR           (default: /music)
@@ -22,6 +26,7 @@
 #   ID3_VERSION         (optional; 3 -> ID3v2.3 write; default: 3)
 #   MAX_FILES           (optional; process at most N files, then stop)
 #   DRY_RUN             (optional; "1" = list candidates but do not modify files)
+#   REENCODE_WORKERS    (optional; parallel ffmpeg re-encodes; default: CPU count)
 # ==============================================================================
 
 import os
@@ -33,13 +38,24 @@ import tempfile
 import subprocess
 import errno 
 import shutil
+import signal
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 
 # --------------------------- Config / Constants -------------------------------
 
+_last_ts_sec = 0
+_last_ts_str = ""
+
 def ts() -> str:
-    """Return [HH:MM:SS] timestamp string for log lines."""
-    return f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]"
+    """Return [HH:MM:SS] timestamp string for log lines (formatted at most once per second)."""
+    global _last_ts_sec, _last_ts_str
+    sec = int(time.time())
+    if sec != _last_ts_sec:
+        _last_ts_str = f"[{datetime.fromtimestamp(sec).strftime('%Y-%m-%d %H:%M:%S')}]"
+        _last_ts_sec = sec
+    return _last_ts_str
 
 def getenv_clean(name: str, default: str = "") -> str:
     v = os.getenv(name, default)
@@ -57,6 +73,7 @@ FF_VBR_Q    = getenv_clean("FFMPEG_VBR_QUALITY", "2")
 ID3_VER     = getenv_clean("ID3_VERSION", "3")
 MAX_FILES   = getenv_clean("MAX_FILES", "")
 DRY_RUN     = getenv_clean("DRY_RUN", "")
+REENCODE_WORKERS = getenv_clean("REENCODE_WORKERS", str(os.cpu_count() or 1))
 
 try:
     GAIN_THRESHOLD = float(THRESH_STR)
@@ -68,25 +85,73 @@ try:
 except ValueError:
     MAX_FILES_INT = None
 
+# processed.list is rewritten after this many re-encodes or this many seconds
+PROC_FLUSH_EVERY = 25
+PROC_FLUSH_SECS  = 30.0
+
+try:
+    REENCODE_WORKERS_INT = max(1, int(REENCODE_WORKERS))
+except ValueError:
+    REENCODE_WORKERS_INT = os.cpu_count() or 1
+
 # --------------------------- Logging ------------------------------------------
 
+def _open_log():
+    """
+    Open the log file once (line-buffered) instead of open/write/close per line,
+    so each line still reaches disk as soon as it is logged. Closed at exit.
+    """
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        fh = open(LOG_PATH, "a", encoding="utf-8", buffering=1)
+    except Exception:
+        return None
+    atexit.register(fh.close)
+    return fh
+
+_LOG_FH = _open_log()
+
 def log(msg: str):
     line = f"{ts()} [REENCODE] {msg}"
     # stdout (for docker log readability)
     print(line, flush=True)
     # file log
+    if _LOG_FH is None:
+        return
     try:
-        os.makedirs(LOG_DIR, exist_ok=True)
-        with open(LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
+        _LOG_FH.write(line + "\n")
     except Exception:
         pass
 
 # --------------------------- Helpers ------------------------------------------
 
-def run(cmd: list[str]) -> subprocess.CompletedProcess:
-    """Run a command and return the CompletedProcess."""
-    return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+def run(cmd: list[str], capture: bool = False) -> subprocess.CompletedProcess:
+    """
+    Run a command and return the CompletedProcess. stdout is always discarded;
+    stderr is captured as text only when capture=True, otherwise sent to /dev/null.
+    """
+    if capture:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              text=True, errors="replace")
+    return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def remove_quietly(path: str) -> None:
+    """Best-effort unlink without an exists() pre-check (one syscall, no TOCTOU race)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def fdatasync_path(path: str) -> None:
+    """
+    Flush a finished file's data to disk with a single fdatasync, so an os.replace
+    that survives a crash never points at a truncated file.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fdatasync(fd)
+    finally:
+        os.close(fd)
 
 def safe_replace(src_tmp: str, dst_final: str) -> None:
     """
@@ -101,47 +166,98 @@ def safe_replace(src_tmp: str, dst_final: str) -> None:
             alt_tmp = os.path.join(dst_dir, f".swap.{os.path.basename(dst_final)}.tmp")
             shutil.copy2(src_tmp, alt_tmp)
             os.replace(alt_tmp, dst_final)
-            os.remove(src_tmp)
+            remove_quietly(src_tmp)
         else:
             raise
 
-def strip_mp3gain_tags(path: str) -> None:
+def strip_ape_tag(path: str) -> bool:
     """
-    Remove mp3gain APEv2 tags if present. This does NOT touch normal ID3 frames.
-    mp3gain: -s d  -> delete APEv2 tags
+    Remove an APEv2 tag (what mp3gain stores its undo/gain info in) in place,
+    without spawning mp3gain. Reads at most the last 160 bytes: the 32-byte
+    "APETAGEX" footer sits at end of file or just before a trailing ID3v1 tag,
+    which is kept. Normal ID3v2 frames are not touched.
+    Returns True if a tag was removed; files without a footer are left as-is.
     """
-    run(["mp3gain", "-s", "d", path])
-
-def remove_from_processed_list(song_path: str) -> None:
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 160))
+        tail = f.read()
+
+        id3v1 = b""
+        footer = tail[-32:]
+        if not footer.startswith(b"APETAGEX") and len(tail) >= 160 and tail[-128:-125] == b"TAG":
+            id3v1 = tail[-128:]
+            footer = tail[-160:-128]
+        if not footer.startswith(b"APETAGEX"):
+            return False
+
+        # footer: preamble(8) version(4) size(4, items+footer) count(4) flags(4) reserved(8)
+        tag_size = int.from_bytes(footer[12:16], "little")
+        flags    = int.from_bytes(footer[20:24], "little")
+        start    = size - len(id3v1) - tag_size - (32 if flags & 0x80000000 else 0)
+        if tag_size < 32 or start < 0:
+            return False  # implausible footer; leave the file alone
+
+        f.truncate(start)
+        if id3v1:
+            f.seek(start)
+            f.write(id3v1)
+    return True
+
+def split_entry(line: str) -> tuple[str, str] | None:
+    """
+    Split a "<timestamp>\t<path>\t<gain>" processed.list line into (path, gain_str).
+    Returns None unless the line has exactly three fields. Uses str.find instead of
+    rstrip()+split() so only the two field slices are allocated.
     """
-    Delete any entry from /data/processed.list whose 2nd field equals song_path.
+    ts_end = line.find("\t")
+    if ts_end < 0:
+        return None
+    p_end = line.find("\t", ts_end + 1)
+    if p_end < 0 or line.find("\t", p_end + 1) >= 0:
+        return None
+    end = len(line) - 1 if line.endswith("\n") else len(line)
+    return line[ts_end + 1:p_end], line[p_end + 1:end]
+
+def flush_processed_list(remove_set: set[str]) -> None:
     """
+    Delete every entry from /data/processed.list whose 2nd field is in remove_set.
+    Called per batch of re-encodes (not per file). No file lock is taken: the shell
+    steps that append to the list (gain_check.sh, integrity_check.sh) never run
+    alongside this one, since run_gainhound.sh's /data/gainhound.lock already runs
+    these steps one at a time.
+    """
+    if not remove_set:
+        return
     try:
-        if not os.path.exists(PROC_LIST):
-            return
-
-        with open(PROC_LIST, "r", encoding="utf-8", errors="ignore") as fin:
-            lines = fin.readlines()
+        try:
+            fin = open(PROC_LIST, "r", encoding="utf-8", errors="ignore")
+        except FileNotFoundError:
+            return  # no list, nothing to prune
 
         proc_dir = os.path.dirname(PROC_LIST) or "."
-        # temp file created in the same dir to avoid cross-device errors
-        with tempfile.NamedTemporaryFile("w", delete=False, dir=proc_dir, encoding="utf-8") as out:
-            for line in lines:
-                parts = line.rstrip("\n").split("\t")
-                if len(parts) != 3:
+        # temp file created in the same dir to avoid cross-device errors;
+        # stream line by line so memory stays flat regardless of list size
+        with fin, tempfile.NamedTemporaryFile("w", delete=False, dir=proc_dir, encoding="utf-8") as out:
+            for line in fin:
+                entry = split_entry(line)
+                if entry is None:
                     out.write(line)
                     continue
-                _ts, pth, _gain = parts
-                if pth == song_path:
+                if entry[0] in remove_set:
                     # skip this line entirely (delete it)
                     continue
                 out.write(line)
 
         # atomic swap within same FS
-        os.replace(out.name, PROC_LIST)
+        try:
+            os.replace(out.name, PROC_LIST)
+        except OSError:
+            remove_quietly(out.name)
+            raise
 
     except Exception as ex:
-        log(f"[WARN] Could not update processed.list for '{song_path}': {ex}")
+        log(f"[WARN] Could not update processed.list ({len(remove_set)} entries): {ex}")
 
 def ffmpeg_reencode(src: str, dst_tmp: str) -> tuple[bool, str]:
     """
@@ -150,13 +266,14 @@ def ffmpeg_reencode(src: str, dst_tmp: str) -> tuple[bool, str]:
     Returns (ok, excerpt_of_output).
     """
     # Build ffmpeg command
+    # -nostdin -loglevel error -nostats: no progress spam, stderr carries errors only
     # -y: overwrite temp file
     # -map 0: keep all streams (audio + cover art), but we'll enforce mp3 output container
     # -map_metadata 0: copy source metadata (basic tags)
     # -codec:a libmp3lame -q:a <VBR>: re-encode audio
     # -id3v2_version 3: standard ID3v2.3
     cmd = [
-        "ffmpeg", "-y",
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-nostats", "-y",
         "-i", src,
         "-map", "0",
         "-map_metadata", "0",
@@ -165,32 +282,66 @@ def ffmpeg_reencode(src: str, dst_tmp: str) -> tuple[bool, str]:
         "-id3v2_version", ID3_VER,
         dst_tmp,
     ]
-    res = run(cmd)
+    res = run(cmd, capture=True)
     ok = (res.returncode == 0)
-    snippet = (res.stdout or "")[:240].replace("\n", " ")
+    snippet = (res.stderr or "")[:240].replace("\n", " ")
     return ok, snippet
 
-def list_candidates_from_processed(threshold: float) -> list[tuple[str, float]]:
+def iter_candidates_from_processed(threshold: float) -> Iterator[tuple[str, float]]:
     """
-    Parse /data/processed.list and return [(path, gain_float), ...] where abs(gain) >= threshold.
+    Stream /data/processed.list and yield (path, gain_float) where abs(gain) >= threshold.
+    Raises FileNotFoundError (on first iteration) if the list does not exist.
     """
-    cands: list[tuple[str, float]] = []
-    if not os.path.exists(PROC_LIST):
-        log(f"[WARN] No {PROC_LIST} found; nothing to do.")
-        return cands
     with open(PROC_LIST, "r", encoding="utf-8", errors="ignore") as f:
         for line in f:
-            parts = line.rstrip("\n").split("\t")
-            if len(parts) != 3:
+            entry = split_entry(line)
+            if entry is None:
                 continue
-            _ts, path, gain_str = parts
+            path, gain_str = entry
             try:
                 gain = float(gain_str)
             except ValueError:
                 continue
             if abs(gain) >= threshold and path.lower().endswith(".mp3"):
-                cands.append((path, gain))
-    return cands
+                yield (path, gain)
+
+def _process_one(path: str, gain: float) -> tuple[bool, str]:
+    """
+    Re-encode one file in place: ffmpeg -> strip APE tags -> atomic replace.
+    Runs in a worker thread; returns (ok, error_message) and leaves logging and
+    processed.list bookkeeping to the caller.
+    """
+    # Prepare a unique temp output in the same directory for atomic swap
+    try:
+        fd, out_tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                       prefix=f".{os.path.basename(path)}.", suffix=".reenc.tmp.mp3")
+        os.close(fd)
+    except OSError as ex:
+        return False, f"Could not create temp file for: {path} :: {ex}"
+
+    ok_ff, out_snip = ffmpeg_reencode(path, out_tmp)
+    if not ok_ff:
+        # Clean temp on failure
+        remove_quietly(out_tmp)
+        return False, f"ffmpeg failed: {path} (gain={gain:+.2f} dB) :: {out_snip}"
+
+    # Remove mp3gain APE tags from the new file (best effort, as mp3gain -s d was)
+    try:
+        strip_ape_tag(out_tmp)
+    except OSError:
+        pass
+
+    # Replace original atomically (temp data made durable first)
+    try:
+        shutil.copymode(path, out_tmp)  # mkstemp creates 0600; keep the original's mode
+        fdatasync_path(out_tmp)
+        safe_replace(out_tmp, path)
+    except Exception as ex:
+        # Attempt to clean temp
+        remove_quietly(out_tmp)
+        return False, f"Atomic replace failed for: {path} :: {ex}"
+
+    return True, ""
 
 # --------------------------- Plex Analyze (post hook) -------------------------
 
@@ -215,18 +366,15 @@ def analyze_plex_posthook():
     except ValueError:
         timeout = 60
 
-    if not os.path.exists(script):
-        log("[INFO] Plex analyze script not found; skipping post-hook.")
-        return
-
     if mode == "bg":
         # Non-blocking: detach and return immediately
         log("[INFO] Triggering Plex analyze post-hook (mode=bg)...")
         try:
             # Send stdout/stderr to /dev/null so this never blocks exit
-            with open(os.devnull, "wb") as devnull:
-                subprocess.Popen([script], stdout=devnull, stderr=subprocess.STDOUT)
+            subprocess.Popen([script], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             log("[INFO] Plex analyze launched in background.")
+        except FileNotFoundError:
+            log("[INFO] Plex analyze script not found; skipping post-hook.")
         except Exception as ex:
             log(f"[WARN] Failed to launch Plex analyze in background: {ex}")
         return
@@ -242,33 +390,40 @@ def analyze_plex_posthook():
             log("[INFO] Plex analyze completed (rc=0).")
         else:
             log(f"[WARN] Plex analyze exited with rc={code}; tail: {tail}")
+    except FileNotFoundError:
+        log("[INFO] Plex analyze script not found; skipping post-hook.")
     except subprocess.TimeoutExpired:
         log(f"[WARN] Plex analyze timed out after {timeout}s (continuing).")
     except Exception as ex:
         log(f"[WARN] Failed to invoke Plex analyze: {ex}")
 
-@atexit.register
-def _post_exit():
-    # Ensure Plex analyze runs even if we exit early (best effort).
-    analyze_plex_posthook()
+# Set by main() once at least one file was actually replaced; early exits
+# (no candidates, DRY_RUN, nothing succeeded) leave Plex alone.
+_TRIGGER_POSTHOOK = False
 
 # --------------------------- Main --------------------------------------------
 
 def main() -> int:
+    global _TRIGGER_POSTHOOK
+
     # Banner
     log(f"Starting re-encode scan (threshold={GAIN_THRESHOLD} dB, dir={MUSIC_DIR})")
     if DRY_RUN == "1":
         log("[INFO] DRY_RUN=1 — will list candidates only, no writes.")
 
-    all_candidates = list_candidates_from_processed(GAIN_THRESHOLD)
-    grand_total = len(all_candidates)
-
-    candidates = all_candidates
-    if MAX_FILES_INT is not None:
-        candidates = all_candidates[:MAX_FILES_INT]
-    batch_total = len(candidates)
+    # Count unique paths with one streaming pass (processed.list can hold several
+    # lines per file), then stream the batch itself lazily. The list is never held in
+    # memory, but the path sets here and in the submit loop grow with the number of
+    # distinct candidates.
+    try:
+        grand_total = len({path for path, _gain in iter_candidates_from_processed(GAIN_THRESHOLD)})
+    except FileNotFoundError:
+        log(f"[WARN] No {PROC_LIST} found; nothing to do.")
+        grand_total = 0
+    candidates = iter_candidates_from_processed(GAIN_THRESHOLD)
+    batch_total = grand_total if MAX_FILES_INT is None else min(grand_total, MAX_FILES_INT)
 
-    log(f"[INFO] Candidates available: {grand_total} | This batch: {batch_total}")
+    log(f"[INFO] Candidates available: {grand_total} | This batch: {batch_total} | Workers: {REENCODE_WORKERS_INT}")
 
 
     # Initialize counters for the loop
@@ -281,56 +436,39 @@ def main() -> int:
         log("[INFO] No candidates to process.")
         return 0
 
-    for (path, gain) in candidates:
-        done += 1
-        if DRY_RUN == "1":
-            log(f"[DRY] {path} (gain={gain:+.2f} dB)")
-            continue
+    # Resolve MUSIC_DIR once; only the candidate path needs realpath per file
+    norm_music_prefix = os.path.join(os.path.realpath(MUSIC_DIR), "")
 
-        # Ensure path lives under MUSIC_DIR (safety)
-        try:
-            norm_music = os.path.realpath(MUSIC_DIR)
-            norm_path  = os.path.realpath(path)
-            if not norm_path.startswith(norm_music + os.sep) and norm_path != norm_music:
-                log(f"[WARN] Skipping outside MUSIC_DIR: {path}")
-                continue
-        except Exception:
-            pass
+    removed: set[str] = set()   # every path re-encoded this run
+    pending: set[str] = set()   # re-encoded but not yet dropped from processed.list
+    last_flush = time.monotonic()
 
-        # Prepare a temp output in the same directory for atomic swap
-        out_tmp = f"{path}.reenc.tmp.mp3"
+    def flush_pending() -> None:
+        nonlocal last_flush
+        flush_processed_list(pending)
+        pending.clear()
+        last_flush = time.monotonic()
 
-        ok_ff, out_snip = ffmpeg_reencode(path, out_tmp)
-        if not ok_ff:
-            fail += 1
-            log(f"[ERROR] ffmpeg failed: {path} (gain={gain:+.2f} dB) :: {out_snip}")
-            # Clean temp on failure
-            try:
-                if os.path.exists(out_tmp):
-                    os.remove(out_tmp)
-            except Exception:
-                pass
-            continue
-
-        # Remove mp3gain APE tags from the new file
-        strip_mp3gain_tags(out_tmp)
-
-        # Replace original atomically
+    def record(fut) -> None:
+        """Tally one finished re-encode (main thread only)."""
+        nonlocal ok, fail, done
+        path, gain = futures.pop(fut)
+        done += 1
         try:
-            safe_replace(out_tmp, path)
+            ok_one, err = fut.result()
         except Exception as ex:
+            ok_one, err = False, f"Unexpected error for: {path} :: {ex}"
+        if not ok_one:
             fail += 1
-            log(f"[ERROR] Atomic replace failed for: {path} :: {ex}")
-            # Attempt to clean temp
-            try:
-                if os.path.exists(out_tmp):
-                    os.remove(out_tmp)
-            except Exception:
-                pass
-            continue
+            log(f"[ERROR] {err}")
+            return
 
-        # Update bookkeeping: remove from processed.list so mp3gain will re-analyze later
-        remove_from_processed_list(path)
+        # Bookkeeping: drop from processed.list so mp3gain re-analyzes later. Batched so a
+        # killed run loses at most PROC_FLUSH_EVERY files / PROC_FLUSH_SECS of bookkeeping.
+        removed.add(path)
+        pending.add(path)
+        if len(pending) >= PROC_FLUSH_EVERY or time.monotonic() - last_flush >= PROC_FLUSH_SECS:
+            flush_pending()
 
         ok += 1
         if ok % 25 == 0 or done % 25 == 0:
@@ -338,6 +476,59 @@ def main() -> int:
 
         log(f"[INFO] Re-encoded: {path} (gain was {gain:+.2f} dB)")
 
+    # ffmpeg does the CPU work in its own process, so threads are enough to keep
+    # REENCODE_WORKERS encoders busy; bookkeeping stays on the main thread.
+    # Candidates are pulled from processed.list only as workers free up, so
+    # encoding starts right away and at most 2x workers jobs are queued at once.
+    max_inflight = REENCODE_WORKERS_INT * 2
+    futures = {}
+    try:
+        with ThreadPoolExecutor(max_workers=REENCODE_WORKERS_INT) as pool:
+            try:
+                seen: set[str] = set()
+                for (path, gain) in candidates:
+                    # gain_check.sh appends a line per run, so the same file can appear
+                    # several times; re-encode each path at most once per run
+                    if path in seen:
+                        continue
+                    if MAX_FILES_INT is not None and len(seen) >= MAX_FILES_INT:
+                        break
+                    seen.add(path)
+
+                    if DRY_RUN == "1":
+                        done += 1
+                        log(f"[DRY] {path} (gain={gain:+.2f} dB)")
+                        continue
+
+                    # Ensure path lives under MUSIC_DIR (safety)
+                    try:
+                        if not os.path.realpath(path).startswith(norm_music_prefix):
+                            done += 1
+                            log(f"[WARN] Skipping outside MUSIC_DIR: {path}")
+                            continue
+                    except Exception:
+                        pass
+
+                    futures[pool.submit(_process_one, path, gain)] = (path, gain)
+                    if len(futures) >= max_inflight:
+                        finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        for fut in finished:
+                            record(fut)
+
+                for fut in as_completed(list(futures)):
+                    record(fut)
+            except BaseException:
+                # SIGTERM/Ctrl-C: drop queued jobs, let running ones finish, and
+                # still book whatever completed so it is not re-encoded next run
+                pool.shutdown(wait=True, cancel_futures=True)
+                for fut in list(futures):
+                    if not fut.cancelled():
+                        record(fut)
+                raise
+    finally:
+        flush_pending()
+        _TRIGGER_POSTHOOK = bool(removed)
+
     # Summary
     if DRY_RUN == "1":
         log(f"DRY RUN complete: listed={batch_total}")
@@ -345,14 +536,22 @@ def main() -> int:
 
     log(f"Re-encode complete: ok={ok}, fail={fail}, total={batch_total}")
 
-    # Recompute remaining candidates after deletions from processed.list
-    try:
-        remaining = len(list_candidates_from_processed(GAIN_THRESHOLD))
-        log(f"[INFO] Remaining candidates: {remaining}")
-    except Exception as ex:
-        log(f"[WARN] Could not compute remaining candidates: {ex}")
+    # Remaining candidates: unique paths counted up front minus those removed (the
+    # flush drops every line for a removed path), no second parse
+    log(f"[INFO] Remaining candidates: {grand_total - len(removed)}")
 
     return 0 if fail == 0 else 3
 
+def _exit_on_sigterm(signum, _frame):
+    # docker stop sends SIGTERM; turn it into SystemExit so finally blocks run
+    raise SystemExit(128 + signum)
+
 if __name__ == "__main__":
-    sys.exit(main())
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        rc = main()
+    finally:
+        # Runs even if main() raised, as long as something was re-encoded
+        if _TRIGGER_POSTHOOK:
+            analyze_plex_posthook()
+    sys.exit(rc)